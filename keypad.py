@@ -24,10 +24,78 @@
 """
 # queue.py and parser.py must be uploaded to the Pico
 from machine import Pin
+import micropython
+from micropython import const
+from array import array
+from time import sleep_us
 import uasyncio as asyncio
 from queue import CharBuffer
 from parser import Lexer, LToken
 
+# RP2040 SIO registers as ptr32 word offsets from SIO_BASE
+SIO_BASE = const(0xd0000000)
+GPIO_IN = const(1)  # 0x004
+GPIO_OUT_SET = const(5)  # 0x014
+GPIO_OUT_CLR = const(6)  # 0x018
+# row and column settle time: pull-downs and matrix capacitance
+SETTLE_US = const(10)  # us
+
+
+@micropython.viper
+def scan_nodes(row_bits, col_shifts, nodes) -> int:
+    """ viper: set each row high in turn and read columns
+        - SETTLE_US wait after setting and after clearing each row
+        - row_bits: array('I') of row-pin bit masks
+        - col_shifts: bytes of column pin numbers
+        - nodes: bytearray set to node states, (row * n_cols + col)
+    """
+    sio = ptr32(SIO_BASE)
+    rows = ptr32(row_bits)
+    shifts = ptr8(col_shifts)
+    states = ptr8(nodes)
+    n_rows = int(len(row_bits))
+    n_cols = int(len(col_shifts))
+    index = 0
+    for r in range(n_rows):
+        sio[GPIO_OUT_SET] = rows[r]
+        sleep_us(SETTLE_US)  # columns settle to row level
+        gpio_in = sio[GPIO_IN]
+        sio[GPIO_OUT_CLR] = rows[r]
+        sleep_us(SETTLE_US)  # columns settle low before next row
+        for c in range(n_cols):
+            states[index] = (gpio_in >> shifts[c]) & 1
+            index += 1
+    return index
+
+
+@micropython.viper
+def new_presses(nodes, counts, latched, threshold: int) -> int:
+    """ viper: integrate node states; return bit-mask of new key-presses
+        - counts: bytearray of per-node integrators, 0 to threshold
+        - latched: bytearray, node set to 1 while key-press is registered
+        - bit index is node index
+    """
+    now = ptr8(nodes)
+    cnt = ptr8(counts)
+    lat = ptr8(latched)
+    n = int(len(nodes))
+    mask = 0
+    for i in range(n):
+        c = int(cnt[i])
+        if now[i]:
+            if c < threshold:
+                c += 1
+        elif c > 0:
+            c -= 1
+        cnt[i] = c
+        if c == threshold:
+            if lat[i] == 0:
+                lat[i] = 1
+                mask |= 1 << i
+        elif c == 0:
+            lat[i] = 0
+    return mask
+
 
 class SwitchMatrix:
     """ matrix of switched nodes
@@ -38,22 +106,20 @@ class SwitchMatrix:
         # rows set high in sequence, columns scanned as inputs
         self.col_pins = [Pin(pin, mode=Pin.IN, pull=Pin.PULL_DOWN) for pin in cols]
         self.row_pins = [Pin(pin, mode=Pin.OUT, value=0) for pin in rows]
+        self._row_bits = array('I', [1 << pin for pin in rows])
+        self._col_shifts = bytes(cols)  # GPIO_IN bit for each column
         self._list_len = len(cols) * len(rows)
-        self.m_list = [0] * self._list_len  # fixed-length list
+        self.m_list = bytearray(self._list_len)  # fixed length
 
     def __len__(self):
         """ length of matrix as list """
         return self._list_len
 
     def scan_matrix(self):
-        """ scan matrix nodes by (col, row) """
-        index = 0
-        for r_pin in self.row_pins:
-            r_pin.high()
-            for c_pin in self.col_pins:
-                self.m_list[index] = c_pin.value()
-                index += 1  # row * n_cols + col
-            r_pin.low()
+        """ scan matrix nodes by (col, row)
+            - viper: SIO register access; one GPIO_IN read per row
+        """
+        scan_nodes(self._row_bits, self._col_shifts, self.m_list)
         return self.m_list
 
 
@@ -68,6 +134,9 @@ class KeyPad(SwitchMatrix):
     symbols = set('*#')
     alphanumeric = digits.union(letters)
 
+    POLL_MS = const(2)  # scan interval
+    DB_SCANS = const(5)  # de-bounce: consecutive closed scans to register
+
     def __init__(self, cols, rows, buffer):
         super().__init__(cols, rows)
         self.buffer = buffer
@@ -76,18 +145,22 @@ class KeyPad(SwitchMatrix):
     async def key_input(self):
         """ coro: detect key-presses in switch matrix
             - data producer: put char into buffer
+            - new_presses() returns bit-mask of newly-pressed keys
+            - poll interval is independent of de-bounce period
         """
-        scan_interval = 100  # ms - adjust as required
+        key_list = self.key_list
+        counts = bytearray(len(self))
+        latched = bytearray(len(self))
         while True:
-            m_states = self.scan_matrix()
-            for index in range(len(self)):
-                node_state = m_states[index]
-                key = self.key_list[index]
-                if key.state != node_state:
-                    if node_state == 1:
-                        await self.buffer.put(key.char)
-                    key.state = node_state
-            await asyncio.sleep_ms(scan_interval)
+            pressed = new_presses(
+                self.scan_matrix(), counts, latched, self.DB_SCANS)
+            index = 0
+            while pressed:
+                if pressed & 1:
+                    await self.buffer.put(key_list[index].char)
+                pressed >>= 1
+                index += 1
+            await asyncio.sleep_ms(self.POLL_MS)
 
 
 class Key:
@@ -95,7 +168,6 @@ class Key:
 
     def __init__(self, char):
         self._char = char
-        self.state = 0
         self.pressed = False
 
     @property
@@ -0,0 +1,27 @@
+""" Use Pulse Width Modulation to set perceived LED output level
+    - shared by the LED demonstration scripts
+"""
+
+from machine import Pin, PWM
+from array import array
+
+
+class LedDriver(PWM):
+    """ modulate PWM output to change LED brightness
+        - duty cycle set as integer percent, 0 - 100
+    """
+
+    # percent to duty_u16 lookup: single array of 101 unsigned shorts
+    PC_U16 = array('H', [pc * 0xffff // 100 for pc in range(101)])
+
+    def __init__(self, pin, freq):
+        super().__init__(Pin(pin))
+        self.freq(freq)
+        self.id = pin
+
+    def set_pc(self, pc):
+        """ set output duty-cycle """
+        if 0 <= pc <= 100:
+            self.duty_u16(self.PC_U16[pc])
+        else:
+            print(f'duty cycle: {pc} not implemented')
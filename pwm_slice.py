@@ -0,0 +1,22 @@
+""" RP2040 PWM slice frequency setting
+    - shared by the servo scripts and servo_sg9x
+    - 2 channels (pins) share each slice frequency
+"""
+
+# slices with frequency set
+_freq_slices = set()
+
+
+def clear_slice_freqs():
+    """ forget slice frequency settings
+        - call before (re-)creating a group of servos
+    """
+    _freq_slices.clear()
+
+
+def set_slice_freq(pwm, pin, freq):
+    """ set PWM frequency once for the slice of pin """
+    slice_n = (pin >> 1) & 7
+    if slice_n not in _freq_slices:
+        pwm.freq(freq)
+        _freq_slices.add(slice_n)
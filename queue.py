@@ -1,6 +1,7 @@
 """ Queue class """
 
 import uasyncio as asyncio
+from micropython import const
 
 
 class Queue:
@@ -99,6 +100,39 @@ class CharBuffer:
         return self._item
 
 
+class KeyBuffer:
+    """ ring buffer of single-byte items
+        - single producer and single consumer assumed
+        - put() is not a coro: no Lock or is_space Event
+        - a new item is dropped if the buffer is full
+    """
+
+    LENGTH = const(16)  # must be a power of 2
+
+    def __init__(self):
+        self._buf = bytearray(self.LENGTH)
+        self._head = 0
+        self._tail = 0
+        self.is_data = asyncio.Event()
+
+    def put(self, item):
+        """ add byte item (ASCII code) to buffer """
+        tail = (self._tail + 1) & (self.LENGTH - 1)
+        if tail != self._head:
+            self._buf[self._tail] = item
+            self._tail = tail
+            self.is_data.set()
+
+    async def get(self):
+        """ remove byte item (ASCII code) from buffer """
+        await self.is_data.wait()
+        item = self._buf[self._head]
+        self._head = (self._head + 1) & (self.LENGTH - 1)
+        if self._head == self._tail:
+            self.is_data.clear()
+        return item
+
+
 async def main():
     """ test Queue class """
     print('In main()')
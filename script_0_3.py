@@ -2,8 +2,11 @@
     GPIO switch input and LED output
 """
 
-from machine import Pin
-from time import sleep_ms
+from machine import Pin, idle
+import micropython
+from micropython import const
+
+DEBUG = const(False)  # print per-poll diagnostics
 
 
 class HwSwitch:
@@ -22,6 +25,11 @@ class HwSwitch:
         """ get switch state off (0) or on (1) """
         return 0 if self._hw_in.value() == 1 else 1
 
+    def set_irq(self, handler):
+        """ call handler on switch open or close """
+        self._hw_in.irq(handler=handler,
+                        trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
 
 class LedOut:
     """ output pin for LED """
@@ -47,20 +55,40 @@ class HwSwitchGroup:
         self._states = {}
         for pin in switch_pins_:
             self._states[pin] = 0 
+        # states in switch_pins_ order; bound value() methods
+        self._states_b = bytearray(self.n_switches)
+        self._hw_reads = tuple([self.switches[pin]._hw_in.value
+                                for pin in switch_pins_])
 
     def get_states(self):
-        """ scan switch states """
-        self._states = {
-            pin: self.switches[pin].get_state() for pin in self.pins
-        }
-        return self._states
+        """ scan switch states
+            - _states dict is updated in place: not created for each call
+        """
+        states = self._states
+        switches = self.switches
+        for pin in self.pins:
+            states[pin] = switches[pin].get_state()
+        return states
+
+    def read_states(self):
+        """ scan switch states into bytearray, in pins order
+            - no dict look-ups: for polling
+        """
+        states = self._states_b
+        i = 0
+        for value in self._hw_reads:
+            states[i] = 0 if value() else 1
+            i += 1
+        return states
+
+    def set_irq(self, handler):
+        """ call handler on any switch change """
+        for switch in self.switches.values():
+            switch.set_irq(handler)
 
     def print_states(self):
         """ print states in pin order """
-        states = ''
-        for pin in self.pins:
-            states += f'{pin}: {self._states[pin]}, '
-        print(states[:-2])
+        print(', '.join([f'{pin}: {self._states[pin]}' for pin in self.pins]))
 
 
 def main():
@@ -81,15 +109,36 @@ def main():
     switch_group = HwSwitchGroup(switch_pins)
     leds = {pin: LedOut(pin) for pin in led_pins}
 
-    poll_interval = 1_000  # ms
-    print('Poll switches')
+    # LEDs for each switch, in switch_pins order
+    idx_leds = tuple([tuple([leds[led_pin] for led_pin in switch_led[sw_pin]])
+                      for sw_pin in switch_pins])
+    prev_states = bytearray(b'\xff' * len(switch_pins))  # force first set
+
+    def poll_once(_):
+        """ set LEDs from changed switch states """
+        states = switch_group.read_states()
+        if states == prev_states:
+            return
+        if DEBUG:
+            print(states)
+        for i in range(len(states)):
+            if states[i] != prev_states[i]:
+                for led in idx_leds[i]:  # set each connected LED
+                    led.set_state(states[i])
+        prev_states[:] = states
+
+    def switch_irq(_):
+        """ switch IRQ handler: run poll_once() outside interrupt context """
+        try:
+            micropython.schedule(poll_once, None)
+        except RuntimeError:
+            pass  # schedule queue full: switch bounce
+
+    print('Set LEDs on switch change')
+    poll_once(None)  # match initial switch states
+    switch_group.set_irq(switch_irq)
     while True:
-        states = switch_group.get_states()
-        print(states)
-        for sw_pin in states:
-            for led_pin in switch_led[sw_pin]:  # set each connected LED
-                leds[led_pin].set_state(states[sw_pin])
-        sleep_ms(poll_interval)    
+        idle()  # wait for next interrupt
 
 
 if __name__ == '__main__':
@@ -1,27 +1,7 @@
 """ Use Pulse Width Modulation to set perceived LED output level """
 
-from machine import Pin, PWM
-from micropython import const
-
-
-class LedDriver(PWM):
-    """ modulate PWM output to change LED brightness
-        - duty cycle set as integer percent, 0 - 100
-    """
-
-    PC_DC = {pc: round(pc * 0xffff // 100) for pc in range(101)}
-
-    def __init__(self, pin, freq):
-        super().__init__(Pin(pin))
-        self.freq(freq)
-        self.id = pin
-
-    def set_pc(self, pc):
-        """ set output duty-cycle """
-        if 0 <= pc <= 100:
-            self.duty_u16(self.PC_DC[pc])
-        else:
-            print(f'duty cycle: {pc} not implemented')
+# led_pwm.py must be uploaded to the Pico
+from led_pwm import LedDriver
 
 
 def main():
@@ -1,12 +1,18 @@
 """
     GPIO switch input and servo control
     N.B. Demonstration code: prioritises clarity before efficiency
-    - non-asyncio: servos must be set sequentially
+    - non-asyncio: a group of servos is stepped in a single loop
 """
 
 from machine import Pin, PWM
+import micropython
 from micropython import const
-from time import sleep_ms
+from time import sleep_ms, ticks_ms, ticks_add, ticks_diff
+from array import array
+# pwm_slice.py must be uploaded to the Pico
+from pwm_slice import set_slice_freq, clear_slice_freqs
+
+DEBUG = const(False)  # print per-demand diagnostics
 
 
 class ServoSG9x(PWM):
@@ -39,84 +45,90 @@ class ServoSG9x(PWM):
     MIN_WAIT = const(200)  # ms
     SET_WAIT = const(500)  # ms
 
+    # minimum pulse-width change per transition step
+    # (approx 2 degrees): fewer steps for short moves
+    MIN_PW_STEP = const(20_000)  # ns
+
     def __init__(self, pin, off_deg, on_deg, transition_time=3.0):
         super().__init__(Pin(pin))
-        self.freq(ServoSG9x.FREQ)
+        set_slice_freq(self, pin, self.FREQ)
         self.id = pin  # for diagnostics
-        self.off_ns = self.degrees_to_ns(self.deg_in_range(off_deg))
-        self.on_ns = self.degrees_to_ns(self.deg_in_range(on_deg))
+        self.off_ns = self.degrees_to_ns(off_deg)
+        self.on_ns = self.degrees_to_ns(on_deg)
         self.transition_ms = int(transition_time * 1000)
-        self.pw_ns = None  # for self.activate_pulse()
+        self.pw_ns = None  # restored before each move
         self.state = None
         # set servo transition parameters
         self.pw_range = self.on_ns - self.off_ns
-        self.x_inc = 1
         self.x_steps = 100
-        self.step_ms = self.transition_ms // self.x_steps
+        # number of steps scaled to pulse-width change, up to x_steps
+        # - transition time is maintained
+        self.steps = min(
+            self.x_steps, max(1, abs(self.pw_range) // self.MIN_PW_STEP))
+        self.step_ms = self.transition_ms // self.steps
+        self.pw_inc = self.pw_range // self.steps  # off to on
+        # absolute pulse-width for each step: built once
+        # - final step is set exactly to on_ns or off_ns
+        pw_inc = self.pw_inc
+        self._ramp_on = array(
+            'I', [self.off_ns + i * pw_inc for i in range(1, self.steps)])
+        self._ramp_on.append(self.on_ns)
+        self._ramp_off = array(
+            'I', [self.on_ns - i * pw_inc for i in range(1, self.steps)])
+        self._ramp_off.append(self.off_ns)
+        # group transition: set by start_transition()
+        self._demand = None
+        self._ramp = self._ramp_on
+        self._index = 0
+        self._due = 0
 
-    def degrees_to_ns(self, degrees):
-        """ convert float degrees to int pulse-width ns """
-        return int(self.PW_MIN + degrees * self.NS_PER_DEGREE)
-    
-    def deg_in_range(self, degrees_):
-        """ return value within allowed range """
-        if self.DEG_MIN <= degrees_ <= self.DEG_MAX:
-            value = degrees_
-        else:
-            value = self.DEG_CTR
-        return value
-
-    def move_servo(self, pw_):
-        """ servo machine.PWM setting method """
-        if self.PW_MIN <= pw_ <= self.PW_MAX:
-            self.duty_ns(pw_)
+    @staticmethod
+    def degrees_to_ns(degrees):
+        """ convert float degrees to int pulse-width ns
+            - out-of-range degrees are set to DEG_CTR
+        """
+        if not ServoSG9x.DEG_MIN <= degrees <= ServoSG9x.DEG_MAX:
+            degrees = ServoSG9x.DEG_CTR
+        return int(ServoSG9x.PW_MIN + degrees * ServoSG9x.NS_PER_DEGREE)
 
     def set_off(self):
         """ set servo direct to off position """
-        self.move_servo(self.off_ns)
+        self.duty_ns(self.off_ns)
         self.pw_ns = self.off_ns
         self.state = self.OFF
 
     def set_on(self):
         """ set servo direct to on position """
-        self.move_servo(self.on_ns)
+        self.duty_ns(self.on_ns)
         self.pw_ns = self.on_ns
         self.state = self.ON
 
-    def activate_pulse(self):
-        """ restore PWM output """
-        self.move_servo(self.pw_ns)
-
-    def zero_pulse(self):
-        """ hold output at zero """
-        self.duty_ns(0)
-
-    def transition(self, pw_demand_ns):
-        """ move servo in linear steps with step_ms pause """
-        pw = self.pw_ns
-        pw_inc = (pw_demand_ns - pw) // self.x_steps
-        for _ in range(self.x_steps):
-            pw += pw_inc
-            self.duty_ns(pw)
-            sleep_ms(self.step_ms)
-
-    def set_servo_state(self, demand_):
-        """ set servo to demand position off or on """
-        if demand_ == self.state:
-            return
-        elif demand_ == self.OFF:
-            final_ns = self.off_ns
-        elif demand_ == self.ON:
-            final_ns = self.on_ns
-        else:
-            return
-
-        self.activate_pulse()
-        self.transition(final_ns)
-        self.zero_pulse()
+    def start_transition(self, demand_, now):
+        """ set group-transition parameters; restore PWM
+            - first step is due at now
+        """
+        self._demand = demand_
+        self._ramp = self._ramp_on if demand_ == self.ON else self._ramp_off
+        self._index = 0
+        self._due = now
+        self.duty_ns(self.pw_ns)  # restore pulse
+
+    @micropython.native
+    def next_step(self):
+        """ set next group-transition step
+            - native code: called for each step of each moving servo
+            - return True when move complete (step_ms after last step)
+        """
+        self._due = ticks_add(self._due, self.step_ms)
+        if self._index < self.steps:
+            self.duty_ns(self._ramp[self._index])
+            self._index += 1
+            return False
+        self.duty_ns(0)  # release servo
         # save final state
-        self.pw_ns = final_ns
-        self.state = demand_
+        self.pw_ns = self.on_ns if self._demand == self.ON else self.off_ns
+        self.state = self._demand
+        return True
 
 
 class ServoGroup:
@@ -126,6 +138,7 @@ class ServoGroup:
     """
     
     def __init__(self, servo_parameters, switch_servos_):
+        clear_slice_freqs()  # group (re-)built: set each slice frequency
         self.servos = {}
         for pin in servo_parameters:
             self.servos[pin] = ServoSG9x(pin, *servo_parameters[pin])
@@ -133,6 +146,8 @@ class ServoGroup:
         self.switch_list = list(self.switch_servos.keys())
         self.switch_list.sort()
         print(self.switch_list)
+        # servos in current transition: avoid new list for each demand
+        self._active = [None] * len(self.servos)
 
     def initialise(self, servo_init_):
         """ initialise servos by servo_init dict
@@ -147,16 +162,51 @@ class ServoGroup:
         for servo in self.servos.values():
             servo.duty_ns(0)
     
+    @micropython.native
+    def transition_all(self, n_active):
+        """ step all active servos in a single loop
+            - each servo keeps its own step period
+            - sleep until the next step of any servo is due
+            - native code: loop is integer compares and C calls
+        """
+        active = self._active
+        while n_active:
+            # earliest due step
+            due = active[0]._due
+            for i in range(1, n_active):
+                if ticks_diff(active[i]._due, due) < 0:
+                    due = active[i]._due
+            sleep_ms(max(0, ticks_diff(due, ticks_ms())))
+            now = ticks_ms()
+            i = 0
+            while i < n_active:
+                servo = active[i]
+                if ticks_diff(servo._due, now) <= 0 and servo.next_step():
+                    # move complete: replace by last active servo
+                    n_active -= 1
+                    active[i] = active[n_active]
+                else:
+                    i += 1
+
     def match_demand(self, switch_states):
-        """ set servos from switch_states dictionary """
-        # set in key order
-        switch_ids = list(switch_states)
-        switch_ids.sort()
-        for sw in switch_ids:
+        """ set servos from switch_states dictionary
+            - servos to be moved are stepped together
+        """
+        active = self._active
+        n_active = 0
+        now = ticks_ms()
+        for sw in switch_states:
             demand_state = switch_states[sw]
             for servo_pin in self.switch_servos[sw]:
-                self.servos[servo_pin].set_servo_state(demand_state)
-    
+                servo = self.servos[servo_pin]
+                if demand_state == servo.state:
+                    continue
+                if demand_state == servo.OFF or demand_state == servo.ON:
+                    servo.start_transition(demand_state, now)
+                    active[n_active] = servo
+                    n_active += 1
+        self.transition_all(n_active)
+
 
 def main():
     """ test of servo movement """
@@ -198,7 +248,8 @@ def main():
     print('servo_group initialised')
     print()
     for sw_states in test_sw_states:
-        print(sw_states)
+        if DEBUG:
+            print(sw_states)
         servo_group.match_demand(sw_states)
     print('test complete')
 
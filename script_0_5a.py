@@ -2,14 +2,19 @@
     set servos from switch input
     N.B. Demonstration code: prioritises clarity before efficiency
     - servos are set sequentially
+    - switch changes are signalled by pin IRQ and asyncio Event
 """
 
-from time import sleep_ms
+import uasyncio as asyncio
+import micropython
+from micropython import const
 from script_0_3 import HwSwitchGroup
 from script_0_5 import ServoGroup
 
+DEBUG = const(False)  # print per-change diagnostics
 
-def main():
+
+async def main():
     """ test mechanical switch setting and response """
 
     print('In main()')
@@ -32,10 +37,21 @@ def main():
                      18: [3]
                      }
 
-    polling_interval = 1_000  # ms
-
     # === end of parameters
-    
+
+    change_evt = asyncio.Event()
+
+    def set_change(_):
+        """ scheduled from IRQ: Event.set() is not ISR-safe """
+        change_evt.set()
+
+    def switch_irq(_):
+        """ switch IRQ handler """
+        try:
+            micropython.schedule(set_change, None)
+        except RuntimeError:
+            pass  # schedule queue full: switch bounce
+
     switch_pins = list(switch_servos.keys())
     switch_pins.sort()
     switch_group = HwSwitchGroup(switch_pins)
@@ -44,12 +60,20 @@ def main():
     print('initialising servos...')
     servo_group.initialise(servo_init)
     print('servo_group initialised')
+    switch_group.set_irq(switch_irq)
+    change_evt.set()  # match initial switch states
     while True:
+        await change_evt.wait()
+        change_evt.clear()
         sw_states = switch_group.get_states()
-        print(sw_states)
+        if DEBUG:
+            print(sw_states)
         servo_group.match_demand(sw_states)
-        sleep_ms(polling_interval)
 
     
 if __name__ == '__main__':
-    main()
+    try:
+        asyncio.run(main())
+    finally:
+        asyncio.new_event_loop()  # clear retained state
+        print('execution complete')
@@ -3,26 +3,32 @@
     See: https://github.com/peterhinch  micropython-async
     Above source gratefully acknowledged.
 
-    - 2 coroutines are run as a test.
+    - a coroutine is run with a Timer-driven LED as a test.
 """
 
 import uasyncio as asyncio
-from machine import Pin
+from machine import Pin, Timer
 
 
-async def blink(led, period=1000):
-    """ coro: blink the onboard LED
+def blink(led, period=1000):
+    """ blink the onboard LED by machine.Timer
+        - no asyncio task: the LED is set by Timer callbacks
+        - periodic Timer turns the LED on; one-shot Timer turns it off
+        - returns the periodic Timer: call deinit() to stop
         - earlier versions of MicroPython require
           25 rather than 'LED' if not Pico W
     """
-    # flash LED every period ms approx.
+    # flash LED every period ms
     on_time = 100
-    off_ms = period - on_time
-    while True:
+    off_timer = Timer()  # reused for each flash
+
+    def flash(_):
+        """ Timer callback: LED on for on_time ms """
         led.on()
-        await asyncio.sleep_ms(on_time)  # allow other tasks to run
-        led.off()
-        await asyncio.sleep_ms(off_ms)
+        off_timer.init(mode=Timer.ONE_SHOT, period=on_time,
+                       callback=lambda t: led.off())
+
+    return Timer(mode=Timer.PERIODIC, period=period, callback=flash)
 
 
 async def print_numbers(i_max):
@@ -34,13 +40,16 @@ async def print_numbers(i_max):
 
 async def main():
     """ coro: test of asyncio template """
-    # create_task() does not block locally
     onboard = Pin('LED', Pin.OUT, value=0)
-    asyncio.create_task(blink(onboard))  # scheduled but does not block locally
-    # await blocks locally but allows scheduler to run other tasks
-    await print_numbers(25)
-    print('print_numbers() completed')
-    onboard.off()
+    blink_timer = blink(onboard)  # runs independently of the scheduler
+    try:
+        # await blocks locally but allows scheduler to run other tasks
+        await print_numbers(25)
+        print('print_numbers() completed')
+    finally:
+        # release Timer callback even if print_numbers() is interrupted
+        blink_timer.deinit()
+        onboard.off()
 
 
 if __name__ == '__main__':
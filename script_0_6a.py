@@ -1,34 +1,77 @@
 """ Read matrix keypad with Pi Pico """
 
 from machine import Pin
+from micropython import const
+import rp2
 import uasyncio as asyncio
-from queue import CharBuffer
+from queue import KeyBuffer
+
+
+@rp2.asm_pio(set_init=(rp2.PIO.OUT_HIGH,) * 4,
+             in_shiftdir=rp2.PIO.SHIFT_LEFT)
+def scan_4x4():
+    """ PIO: scan 4 x 4 matrix on request
+        - set each column high in turn; allow inputs to settle
+        - shift in 4 row bits per column: column 0 ends in bits 12-15
+        - push 16-bit result to the RX FIFO
+        - all columns are left high: a key-press raises a row input
+    """
+    pull()  # wait for scan request
+    set(pins, 0b0001)[31]
+    in_(pins, 4)
+    set(pins, 0b0010)[31]
+    in_(pins, 4)
+    set(pins, 0b0100)[31]
+    in_(pins, 4)
+    set(pins, 0b1000)[31]
+    in_(pins, 4)
+    set(pins, 0b1111)
+    push()
 
 
 class SwitchMatrix:
-    """ matrix of up to 16 x 16 switched nodes """
-    
-    def __init__(self, cols, rows):
+    """ matrix of 4 x 4 switched nodes
+        - scanned by a PIO state machine
+        - column pins and row pins must each be consecutive GPIOs
+        - key_flag is set by a rising row input
+    """
+
+    N_COLS = const(4)
+    N_ROWS = const(4)
+    POLL_MS = const(2)  # scan interval while a key is down
+    DB_SCANS = const(5)  # de-bounce: consecutive closed scans to register
+    SM_FREQ = const(1_000_000)  # Hz: 32us settle time per column
+
+    def __init__(self, cols, rows, sm_id=0):
         self.cols = cols  # outputs
         self.rows = rows  # inputs
-        self.col_pins = tuple(
-            [Pin(pin, mode=Pin.OUT) for pin in cols])
         self.row_pins = tuple(
             [Pin(pin, mode=Pin.IN, pull=Pin.PULL_DOWN) for pin in rows])
-        for pin in self.col_pins:
-            pin.low()  # all columns off
+        self._sm = rp2.StateMachine(
+            sm_id, scan_4x4, freq=self.SM_FREQ,
+            set_base=Pin(cols[0]), in_base=self.row_pins[0])
+        self._sm.active(1)
+        self.key_flag = asyncio.ThreadSafeFlag()
+        for pin in self.row_pins:
+            pin.irq(trigger=Pin.IRQ_RISING, handler=self._on_row_edge)
+
+    def _on_row_edge(self, _):
+        """ IRQ handler: signal possible key-press """
+        self.key_flag.set()
 
     def scan_switch(self):
         """ scan for first closed matrix-switch
             - return encoded byte of col,row; 4 bits each
         """
-        for col, c_pin in enumerate(self.col_pins):
-            c_pin.high()
-            for row, r_pin in enumerate(self.row_pins):
-                if r_pin.value():
-                    c_pin.low()
-                    return (col << 4) + row
-            c_pin.low()
+        self._sm.put(0)  # request scan
+        word = self._sm.get()
+        if word:
+            for col in range(self.N_COLS):
+                col_bits = (word >> ((self.N_COLS - 1 - col) * 4)) & 0xf
+                if col_bits:
+                    for row in range(self.N_ROWS):
+                        if col_bits & (1 << row):
+                            return (col << 4) + row
         # no key-press detected
         return None
 
@@ -37,12 +80,12 @@ class KeyPad(SwitchMatrix):
     """ process matrix keypad input
         - output key-value to Buffer object
     """
-    # hex values relate directly to column and row numbers
-    key_values = {0x00: '1', 0x01: '2', 0x02: '3', 0x03: 'A',
-                  0x10: '4', 0x11: '5', 0x12: '6', 0x13: 'B',
-                  0x20: '7', 0x21: '8', 0x22: '9', 0x23: 'C',
-                  0x30: '*', 0x31: '0', 0x32: '#', 0x33: 'D'
-                  }
+    # ASCII key codes indexed by encoded node: (col << 4) + row
+    # - 0 for unused indices
+    key_values = (b'123A\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                  b'456B\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                  b'789C\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                  b'*0#D')
 
     def __init__(self, cols, rows, buffer):
         super().__init__(cols, rows)
@@ -51,30 +94,45 @@ class KeyPad(SwitchMatrix):
     async def key_input(self):
         """ coro: detect single key-press in switch matrix
                 - data producer (put into buffer)
+                - wait for row IRQ, then poll until key released
+                - integrate scans: count up while closed, down while open
+                - key registered once when count reaches DB_SCANS
         """
-        new_press = True
-        # poll switches
+        db_scans = self.DB_SCANS
         while True:
-            node = self.scan_switch()
-            if node is None:
-                new_press = True  # previous key released
-            elif new_press:
-                key_ = self.key_values[node]
-                await self.buffer.put(key_)
-                new_press = False  # supress repeat readings
-            await asyncio.sleep_ms(20)
+            await self.key_flag.wait()
+            count = 0
+            latched = False
+            while True:
+                node = self.scan_switch()
+                if node is None:
+                    if count:
+                        count -= 1
+                elif count < db_scans:
+                    count += 1
+                if count == db_scans:
+                    if not latched:
+                        key_ = self.key_values[node]
+                        if key_:
+                            self.buffer.put(key_)
+                        latched = True  # supress repeat readings
+                elif count == 0:
+                    break  # key released or noise
+                await asyncio.sleep_ms(self.POLL_MS)
 
 
 async def print_buffer(buffer):
-    """ consumer: demonstrate buffered input """
+    """ consumer: demonstrate buffered input
+        - buffer items are ASCII codes: convert for print only
+    """
     print('Waiting for keypad input...')
-    prev_char = ''
+    prev_code = 0
     while True:
-        char = await buffer.get()
-        print(char)
-        if char == '*' and prev_char == '*':
+        code = await buffer.get()
+        print(chr(code))
+        if code == 0x2A and prev_code == 0x2A:  # '*'
             break
-        prev_char = char
+        prev_code = code
     print('break from print_buffer()')
 
 
@@ -83,7 +141,7 @@ async def main():
     cols = (8, 9, 10, 11)
     rows = (12, 13, 14, 15)
 
-    buffer = CharBuffer()
+    buffer = KeyBuffer()
     kp = KeyPad(cols, rows, buffer)
     asyncio.create_task(kp.key_input())
     await print_buffer(buffer)
@@ -6,10 +6,36 @@
 """
 
 import asyncio
-from machine import Pin
+from machine import Pin, mem32
+import micropython
 from micropython import const
-import array
-from script_0_7 import ServoGroup
+from array import array
+from collections import deque
+# servo_sg9x.py and pwm_slice.py must be uploaded to the Pico
+from servo_sg9x import ServoGroup
+
+# RP2040 SIO GPIO_IN register: bit n is GPIO n input level
+SIO_GPIO_IN = const(0xd0000004)
+
+# diagnostics ring: entries and print interval
+DIAG_LEN = const(32)
+DIAG_MS = const(500)  # ms
+
+
+@micropython.viper
+def set_states(gpio_in: int, pin_masks, states):
+    """ viper: set switch states from GPIO_IN word
+        - pin_masks: array('I') of switch-pin bit masks
+        - states: bytearray set to 0 (off) for a high bit, 1 (on) for low
+    """
+    masks = ptr32(pin_masks)
+    st = ptr8(states)
+    n = int(len(states))
+    for i in range(n):
+        if gpio_in & masks[i]:
+            st[i] = 0
+        else:
+            st[i] = 1
 
 
 class HwSwitch(Pin):
@@ -27,7 +53,6 @@ class HwSwitch(Pin):
     def __init__(self, pin):
         super().__init__(pin, Pin.IN, Pin.PULL_UP)
         self.pin = pin  # for diagnostics
-        self.readings = array.array('B', [1] * self.n_readings)  # for de-bounce
 
     def get_state(self):
         """ get switch state; returns 0 (off) or 1 (on) """
@@ -37,15 +62,19 @@ class HwSwitch(Pin):
         """ coro: get switch state with simple de-bounce
             - returns 0 (off) or 1 (on)
             - take n_readings over 20ms
+            - readings are OR-ed: any open reading returns 0
         """
         value = self.value  # pointer to method
-        readings = self.readings
         pause = self.db_pause
-        for i in range(self.n_pauses):
-            readings[i] = value()
+        reading = value()
+        for _ in range(self.n_pauses):
             await asyncio.sleep_ms(pause)
-        readings[self.n_pauses] = value()
-        return 0 if any(readings) else 1
+            reading |= value()
+        return 0 if reading else 1
+
+    def set_irq(self, handler):
+        """ call handler on switch open or close """
+        self.irq(handler=handler, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
 
 
 class HwSwitchGroup:
@@ -55,32 +84,42 @@ class HwSwitchGroup:
         self.switches = {pin: HwSwitch(pin) for pin in switch_pins_}
         self.n_switches = len(switch_pins_)
         self.pins = switch_pins_
-        self._states = {pin: 0 for pin in self.pins}
-        self.tasks = [None] * self.n_switches  # for tasks in get_states_db
-
-    async def get_states(self):
-        """ coro: read switch states
-            - coro only to provide consistent interface
-        """
-        self._states = {
-            pin: self.switches[pin].get_state() for pin in self.pins}
-        return self._states
+        self._mask_array = array('I', [1 << pin for pin in self.pins])
+        # de-bounced states in switch_pins_ order
+        self.states_db = bytearray(self.n_switches)
+        # set by any switch edge: ISR-safe
+        self._change = asyncio.ThreadSafeFlag()
+        self._on_edge = self._set_change  # bind once for IRQ handler
+        for switch in self.switches.values():
+            switch.set_irq(self._on_edge)
+
+    def _set_change(self, _):
+        """ switch IRQ handler """
+        self._change.set()
+
+    async def wait_change(self):
+        """ coro: wait for any switch open or close """
+        await self._change.wait()
 
     async def get_states_db(self):
-        """ coro: poll switch states with de-bounce """
-        for i, pin in enumerate(self.pins):
-            switch = self.switches[pin]
-            self.tasks[i] = switch.get_state_db()
-        result = await asyncio.gather(*self.tasks)
-        for i, pin in enumerate(self.pins):
-            self._states[pin] = result[i]
-        return self._states
+        """ coro: poll switch states with de-bounce
+            - returns bytearray of states in self.pins order
+            - GPIO_IN read n_readings times: all switches sampled together
+            - readings are OR-ed: any open reading gives 0 (off)
+        """
+        pause = HwSwitch.db_pause
+        gpio_in = mem32[SIO_GPIO_IN]
+        for _ in range(HwSwitch.n_pauses):
+            await asyncio.sleep_ms(pause)
+            gpio_in |= mem32[SIO_GPIO_IN]
+        set_states(gpio_in, self._mask_array, self.states_db)
+        return self.states_db
 
     def print_states(self):
-        """ print states in pin order """
+        """ print de-bounced states in pin order """
         states = ''
-        for pin in self.pins:
-            states += f'{pin}: {self._states[pin]}, '
+        for i, pin in enumerate(self.pins):
+            states += f'{pin}: {self.states_db[i]}, '
         print(states[:-2])
 
 
@@ -88,15 +127,6 @@ async def main():
     """ module run-time code """
     print('In main()')
 
-    def get_servo_demand(sw_states_, switch_servos_):
-        """ return dict of servo setting demands """
-        servo_demand = {}
-        for sw_pin_ in sw_states_:
-            demand_ = sw_states_[sw_pin_]
-            for servo_pin_ in switch_servos_[sw_pin_]:
-                servo_demand[servo_pin_] = demand_
-        return servo_demand
-
     # === switch and servo parameters
 
     switch_pins = (16, 17, 18)
@@ -117,28 +147,62 @@ async def main():
 
     # === end of parameters
 
-    async def set_servos(poll_interval_ms=200):
-        """ coro: set servos from switch inputs """
+    # diagnostics: printed by drain_diag(), not from set_servos()
+    diag_ring = deque((), DIAG_LEN)  # oldest entries dropped when full
+
+    async def drain_diag():
+        """ coro: print buffered diagnostics every DIAG_MS """
+        while True:
+            await asyncio.sleep_ms(DIAG_MS)
+            while diag_ring:
+                print(diag_ring.popleft())
 
-        def print_change(result_):
-            """ print result_ if any value not None """
-            for v in result_:
-                if v is not None:
-                    print(result_)
-                    break
+    async def set_servos():
+        """ coro: set servos from switch inputs
+            - switch edge IRQ wakes the loop: no fixed-interval polling
+        """
 
+        def log_change(moved_):
+            """ buffer (id, state) pairs of moved servos, if any """
+            if moved_:
+                diag_ring.append(moved_)
+
+        n_switches = len(switch_pins)
+        # servo pins for each switch, in switch_pins order
+        idx_to_servos = tuple(tuple(switch_servos[sp]) for sp in switch_pins)
+        # switch states implied by servo_init; 0xff if its servos differ
+        prev_states = bytearray(n_switches)
+        for i in range(n_switches):
+            inits = {servo_init[sp] for sp in idx_to_servos[i]}
+            prev_states[i] = inits.pop() if len(inits) == 1 else 0xff
+        servo_demand = dict(servo_init)
         while True:
             sw_states = await switch_group.get_states_db()
-            result = await servo_group.match_demand(
-                get_servo_demand(sw_states, switch_servos))
-            print_change(result)
-            await asyncio.sleep_ms(poll_interval_ms)
+            # bit i set: switch_pins[i] has changed
+            changed = 0
+            for i in range(n_switches):
+                if sw_states[i] != prev_states[i]:
+                    changed |= 1 << i
+            if changed:
+                i = 0
+                while changed:
+                    if changed & 1:
+                        demand = sw_states[i]
+                        for servo_pin in idx_to_servos[i]:
+                            servo_demand[servo_pin] = demand
+                        prev_states[i] = demand
+                    changed >>= 1
+                    i += 1
+                moved = await servo_group.set_demand(servo_demand)
+                log_change(moved)
+            await switch_group.wait_change()
 
     switch_group = HwSwitchGroup(switch_pins)
     servo_group = ServoGroup(servo_params)
     print('initialising servos...')
     servo_group.initialise(servo_init)
     print('servos initialised')
+    asyncio.create_task(drain_diag())
     await set_servos()
 
 
@@ -6,8 +6,17 @@
 
 import uasyncio as asyncio
 from machine import Pin, PWM
-from time import sleep_ms
 import gc
+# pwm_slice.py must be uploaded to the Pico
+from pwm_slice import set_slice_freq, clear_slice_freqs
+
+# collect garbage only when free heap falls below this
+GC_LOW_WATER = const(8192)  # bytes
+DEBUG = const(False)  # print per-demand diagnostics
+
+# motion x axis: steps per transition, step increment
+X_STEPS = const(100)
+X_INC = const(1)
 
 
 class ServoSG9x(PWM):
@@ -53,7 +62,7 @@ class ServoSG9x(PWM):
     def __init__(self, pin, off_deg, on_deg,
                  transition_time=3.0, motion='linear'):
         super().__init__(Pin(pin))
-        self.freq(self.FREQ)
+        set_slice_freq(self, pin, self.FREQ)
         self.id = pin  # for diagnostics
         self.off_ns = self.degrees_to_ns(off_deg)
         self.on_ns = self.degrees_to_ns(on_deg)
@@ -70,13 +79,17 @@ class ServoSG9x(PWM):
         self.state = None
         # set servo transition parameters
         self.pw_range = self.on_ns - self.off_ns
-        self.x_inc = 1
-        self.x_steps = 100
-        self.step_ms = self.transition_ms // self.x_steps
-        self.pw_on_inc = (self.on_ns - self.off_ns) // self.x_steps  # per y step
+        self.step_ms = self.transition_ms // X_STEPS
+        self.pw_on_inc = (self.on_ns - self.off_ns) // X_STEPS  # per y step
         self.on_coords = self.motion_coords[motion_on]
         self.pw_off_inc = -self.pw_on_inc
         self.off_coords = self.motion_coords[motion_off]
+        # step timing: set by ServoGroup
+        self.tick = None  # TickEvent Event
+        self.n_ticks = 1  # ticks per step
+        # move parameters by demand: (pw_inc, final_ns, coords)
+        self.moves = {self.OFF: (self.pw_off_inc, self.off_ns, self.off_coords),
+                      self.ON: (self.pw_on_inc, self.on_ns, self.on_coords)}
 
     def degrees_to_ns(self, degrees):
         """ convert float degrees to int pulse-width ns """
@@ -106,9 +119,10 @@ class ServoSG9x(PWM):
     async def stepper(self, start_pw, pw_inc_, coords_):
         """ move servo in linear segments """
         # avoid repeated dict look-ups
-        step_ms = self.step_ms
-        x_inc = self.x_inc
+        wait_tick = self.tick.wait
+        n_ticks = self.n_ticks
         move_servo = self.move_servo
+        duty_ns = self.duty_ns
         x_0 = 0
         y_0 = 0
         for x1, y1 in coords_:
@@ -116,12 +130,22 @@ class ServoSG9x(PWM):
             pw_1 = pw_inc_ * y1
             segment_pw_inc = (pw_1 - pw_0) // (x1 - x_0)
             pw_ = pw_0 + start_pw
+            # pw_ is monotonic within a segment: check range once
+            pw_end = pw_ + segment_pw_inc * (x1 - x_0)
+            if (self.PW_MIN <= pw_ <= self.PW_MAX
+                    and self.PW_MIN <= pw_end <= self.PW_MAX):
+                set_pw = duty_ns
+            else:
+                set_pw = move_servo
             x = x_0
             while x < x1:
-                x += x_inc
+                x += X_INC
                 pw_ += segment_pw_inc
-                move_servo(pw_)
-                await asyncio.sleep_ms(step_ms)
+                set_pw(pw_)
+                i = n_ticks
+                while i:
+                    await wait_tick()
+                    i -= 1
             x_0 = x1
             y_0 = y1
 
@@ -129,18 +153,10 @@ class ServoSG9x(PWM):
         """ move servo between off and on positions """
         # move servo between off and on pulse-widths
         # set parameters
-        if demand_ == self.state:
-            return
-        elif demand_ == self.OFF:
-            pw_inc = self.pw_off_inc
-            final_ns = self.off_ns
-            coords = self.off_coords
-        elif demand_ == self.ON:
-            pw_inc = self.pw_on_inc
-            final_ns = self.on_ns
-            coords = self.on_coords
-        else:
+        # - ServoGroup does not call for demand_ == self.state
+        if demand_ not in self.moves:
             return
+        pw_inc, final_ns, coords = self.moves[demand_]
         # move servo
         self.duty_ns(self.pw_ns)
         await self.stepper(self.pw_ns, pw_inc, coords)
@@ -158,50 +174,109 @@ class ServoGroup:
     """
     
     def __init__(self, servo_parameters):
+        clear_slice_freqs()  # group (re-)built: set each slice frequency
         self.servos = {pin: ServoSG9x(pin, *servo_parameters[pin])
                        for pin in servo_parameters}
+        # fixed pin and servo order for match_demand: indexed together
+        self._pins = tuple(servo_parameters.keys())
+        self._ordered = tuple(self.servos[pin] for pin in self._pins)
         self.tasks = [None] * len(self.servos)
+        # shared step tick for concurrent servo moves
+        # - greatest common divisor of step periods: exact step timing
+        tick_ms = 0
+        for servo in self.servos.values():
+            a, b = tick_ms, servo.step_ms
+            while b:
+                a, b = b, a % b
+            tick_ms = a
+        tick_ms = max(1, tick_ms)
+        self.ticks = TickEvent(tick_ms)
+        for servo in self.servos.values():
+            servo.tick = self.ticks.tick
+            servo.n_ticks = max(1, servo.step_ms // tick_ms)
+        # join servo tasks without asyncio.gather()
+        self._pending = 0
+        self._done = asyncio.Event()
+        self._results = [None] * len(self.servos)  # for testing
 
-    def initialise(self, servo_init_: dict):
-        """ initialise servos by servo_init dict
+    async def initialise(self, servo_init_: dict):
+        """ coro: initialise servos by servo_init dict
             - allows for reading initial states from file
-            - not async: avoid start-up current spike
+            - servos set in turn: avoid start-up current spike
         """
         for pin in servo_init_:
             if servo_init_[pin] == 1:
                 self.servos[pin].set_on()
             else:
                 self.servos[pin].set_off()
-            sleep_ms(500)  # allow movement time
+            await asyncio.sleep_ms(500)  # allow movement time
         for servo in self.servos.values():
             servo.duty_ns(0)
 
+    async def _run(self, coro, i):
+        """ coro: run servo move; set _done when all moves complete """
+        try:
+            self._results[i] = await coro
+        finally:
+            self._pending -= 1
+            if self._pending == 0:
+                self._done.set()
+
     async def match_demand(self, demand: dict):
         """ coro: move each servo to match switch demands """
         # assign tasks elements: avoid creating new list each call
         tasks = self.tasks
-        for i, srv_id in enumerate(demand):
-            servo_ = self.servos[srv_id]
-            # coros will not run until awaited
-            tasks[i] = servo_.move_servo(demand[srv_id])
+        results = self._results
+        pins = self._pins
+        ordered = self._ordered
+        n_tasks = 0
+        for i in range(len(ordered)):
+            servo_ = ordered[i]
+            srv_demand = demand.get(pins[i])
+            if srv_demand is None or srv_demand == servo_.state:
+                continue  # no coro required
+            # coros will not run until scheduled
+            tasks[n_tasks] = servo_.set_on_off(srv_demand)
+            n_tasks += 1
+        for i in range(n_tasks, len(results)):
+            results[i] = None  # clear previous results
         # code for 'concurrent' setting
-        result = await asyncio.gather(*tasks)
-        return result  # for testing
+        self._pending = n_tasks
+        self._done.clear()
+        for i in range(n_tasks):
+            asyncio.create_task(self._run(tasks[i], i))
+        if n_tasks:
+            ticker = asyncio.create_task(self.ticks.run())
+            await self._done.wait()
+            ticker.cancel()
+        return self._results  # for testing
+
+
+class TickEvent:
+    """ step tick shared by concurrent servo moves
+        - a single timed sleep per tick wakes all waiting servos
+        - asyncio Event: any number of waiters, unlike the
+          ThreadSafeFlag of servo_sg9x.TickSource
+    """
+
+    def __init__(self, period_ms):
+        self.period_ms = period_ms
+        self.tick = asyncio.Event()
+
+    async def run(self):
+        """ coro: set tick every period_ms """
+        tick = self.tick
+        period = self.period_ms
+        while True:
+            await asyncio.sleep_ms(period)
+            tick.set()  # waiting servos are scheduled
+            tick.clear()
     
 
 async def main():
     """ test servo operation from pre-set "switch" values """
     print('In main()')
 
-    def get_servo_demand(sw_states_, switch_servos_):
-        """ return dict of servo setting demands """
-        servo_demand = {}
-        for sw_pin_ in sw_states_:
-            demand_ = sw_states_[sw_pin_]
-            for servo_pin_ in switch_servos_[sw_pin_]:
-                servo_demand[servo_pin_] = demand_
-        return servo_demand
-
     # switch states in standard interface dict format
     # switch test states include no-change values
     test_sw_states = ({16: 0, 17: 0, 18: 0},
@@ -234,16 +309,32 @@ async def main():
 
     # === end of parameters
 
+    # (switch-pin, servo-pin) pairs: switch-servo binding is static
+    sw_servo_pairs = tuple((sw_pin, servo_pin) for sw_pin in switch_servos
+                           for servo_pin in switch_servos[sw_pin])
+    servo_demand = {servo_pin: 0 for _, servo_pin in sw_servo_pairs}
+
+    def fill_demand(sw_states_):
+        """ set servo_demand values in place from switch states
+            - servo_demand dict is reused: not created for each call
+        """
+        for sw_pin_, servo_pin_ in sw_servo_pairs:
+            servo_demand[servo_pin_] = sw_states_[sw_pin_]
+        return servo_demand
+
     servo_group = ServoGroup(servo_params)
     print('initialising servos...')
-    servo_group.initialise(servo_init)
+    await servo_group.initialise(servo_init)
     print('servo_group initialised')
+    gc.collect()  # clear start-up garbage before the test loop
     for sw_states in test_sw_states:
-        print(sw_states)
-        settings = await servo_group.match_demand(
-            get_servo_demand(sw_states, switch_servos))
-        print(settings)
-        gc.collect()
+        if DEBUG:
+            print(sw_states)
+        settings = await servo_group.match_demand(fill_demand(sw_states))
+        if DEBUG:
+            print(settings)
+        if gc.mem_free() < GC_LOW_WATER:
+            gc.collect()
         await asyncio.sleep_ms(1_000)
 
     
@@ -6,9 +6,20 @@
 
 import uasyncio as asyncio
 from machine import Pin, PWM
-from time import sleep_ms
+from time import ticks_ms, ticks_add, ticks_diff
+from array import array
 import json
 import gc
+# pwm_slice.py must be uploaded to the Pico
+from pwm_slice import set_slice_freq, clear_slice_freqs
+
+# collect garbage only when free heap falls below this
+GC_LOW_WATER = const(8192)  # bytes
+DEBUG = const(False)  # print per-demand diagnostics
+
+# motion x axis: steps per transition, step increment
+X_STEPS = const(100)
+X_INC = const(1)
 
 
 class ServoSG9x(PWM):
@@ -39,6 +50,9 @@ class ServoSG9x(PWM):
     PAUSE = const(200)  # ms
     SERVO_WAIT = const(500)  # ms
 
+    # step tables by (start_pw, pw_inc, coords): shared by matching servos
+    step_tables = {}
+
     # motion: x, y axes; straight line between specified points
     # from point (0, 0) to (100, 100); (0, 0) assumed
     motion_set = {'linear', 'overshoot', 'bounce', 's_curve',
@@ -54,7 +68,7 @@ class ServoSG9x(PWM):
     def __init__(self, pin, off_deg, on_deg,
                  transition_time=3.0, motion='linear'):
         super().__init__(Pin(pin))
-        self.freq(self.FREQ)
+        set_slice_freq(self, pin, self.FREQ)
         self.id = pin  # for diagnostics
         self.off_ns = self.degrees_to_ns(off_deg)
         self.on_ns = self.degrees_to_ns(on_deg)
@@ -71,13 +85,26 @@ class ServoSG9x(PWM):
         self.state = None
         # set servo transition parameters
         self.pw_range = self.on_ns - self.off_ns
-        self.x_inc = 1
-        self.x_steps = 100
-        self.step_ms = self.transition_ms // self.x_steps
-        self.pw_on_inc = (self.on_ns - self.off_ns) // self.x_steps  # per y step
+        self.step_ms = self.transition_ms // X_STEPS
+        self.pw_on_inc = (self.on_ns - self.off_ns) // X_STEPS  # per y step
         self.on_coords = self.motion_coords[motion_on]
         self.pw_off_inc = -self.pw_on_inc
         self.off_coords = self.motion_coords[motion_off]
+        # pulse-width for each step: built once, not for each move
+        self.off_steps = self.build_steps(
+            self.on_ns, self.pw_off_inc, self.off_coords)
+        self.on_steps = self.build_steps(
+            self.off_ns, self.pw_on_inc, self.on_coords)
+        # move parameters by demand: (steps, final_ns)
+        self.moves = {self.OFF: (self.off_steps, self.off_ns),
+                      self.ON: (self.on_steps, self.on_ns)}
+        # group-driven move: set by ServoGroup and start_move()
+        self.n_ticks = 1  # group ticks per step
+        self._steps = self.on_steps
+        self._final_ns = self.on_ns
+        self._demand = None
+        self._index = 0
+        self._wait = 0
 
     def degrees_to_ns(self, degrees):
         """ convert float degrees to int pulse-width ns """
@@ -104,12 +131,17 @@ class ServoSG9x(PWM):
         self.pw_ns = self.on_ns
         self.state = self.ON
 
-    async def stepper(self, start_pw, pw_inc_, coords_):
-        """ move servo in linear segments """
-        # avoid repeated dict look-ups
-        step_ms = self.step_ms
-        x_inc = self.x_inc
-        move_servo = self.move_servo
+    def build_steps(self, start_pw, pw_inc_, coords_):
+        """ return array of pulse-widths for a move in linear segments
+            - steps are clamped to PW_MIN, PW_MAX: no check when moving
+            - servos with the same move share one array
+        """
+        key = (start_pw, pw_inc_, coords_)
+        if key in ServoSG9x.step_tables:
+            return ServoSG9x.step_tables[key]
+        pw_min = self.PW_MIN
+        pw_max = self.PW_MAX
+        steps = array('i')
         x_0 = 0
         y_0 = 0
         for x1, y1 in coords_:
@@ -119,75 +151,121 @@ class ServoSG9x(PWM):
             pw_ = pw_0 + start_pw
             x = x_0
             while x < x1:
-                x += x_inc
+                x += X_INC
                 pw_ += segment_pw_inc
-                move_servo(pw_)
-                await asyncio.sleep_ms(step_ms)
+                steps.append(min(max(pw_, pw_min), pw_max))
             x_0 = x1
             y_0 = y1
+        ServoSG9x.step_tables[key] = steps
+        return steps
 
-    async def set_on_off(self, demand_):
-        """ move servo between off and on positions """
-        # move servo between off and on pulse-widths
-        # set parameters
-        if demand_ == self.state:
-            return
-        elif demand_ == self.OFF:
-            pw_inc = self.pw_off_inc
-            final_ns = self.off_ns
-            coords = self.off_coords
-        elif demand_ == self.ON:
-            pw_inc = self.pw_on_inc
-            final_ns = self.on_ns
-            coords = self.on_coords
-        else:
-            return
-        # move servo
+    def start_move(self, demand_):
+        """ set parameters for a group-driven move; restore pulse """
+        self._steps, self._final_ns = self.moves[demand_]
+        self._demand = demand_
+        self._index = 0
+        self._wait = 0
         self.duty_ns(self.pw_ns)
-        await self.stepper(self.pw_ns, pw_inc, coords)
+
+    def advance(self):
+        """ set next step when due
+            - called once per group tick
+            - return True when move complete (one step after last)
+        """
+        if self._wait:
+            self._wait -= 1
+            return False
+        if self._index < len(self._steps):
+            self.duty_ns(self._steps[self._index])
+            self._index += 1
+            self._wait = self.n_ticks - 1
+            return False
         self.duty_ns(0)
         # save final state for next move
-        self.pw_ns = final_ns
-        self.state = demand_
-        return self.state  # for testing
+        self.pw_ns = self._final_ns
+        self.state = self._demand
+        return True
 
 
 class ServoGroup:
     """ create a dictionary of servo objects for servo control
         - pin_number: servo-object
-        - switch_servos_ binds each servo to a specific switch input
+        - servo_rows: (pin, off_deg, on_deg, ...) for each servo
     """
     
-    def __init__(self, servo_parameters):
-        self.servos = {pin: ServoSG9x(pin, *servo_parameters[pin])
-                       for pin in servo_parameters}
-        self.tasks = [None] * len(self.servos)
+    def __init__(self, servo_rows):
+        clear_slice_freqs()  # group (re-)built: set each slice frequency
+        self.servos = {row[0]: ServoSG9x(*row) for row in servo_rows}
+        # single group tick for all moving servos
+        # - greatest common divisor of step periods: exact step timing
+        tick_ms = 0
+        for servo in self.servos.values():
+            a, b = tick_ms, servo.step_ms
+            while b:
+                a, b = b, a % b
+            tick_ms = a
+        self.tick_ms = max(1, tick_ms)
+        for servo in self.servos.values():
+            servo.n_ticks = max(1, servo.step_ms // self.tick_ms)
+        self._active = []  # servos that must move
+        self._moved = []  # servos moved: not reordered by drive_group()
 
-    def initialise(self, servo_init_: dict):
-        """ initialise servos by servo_init dict
+    async def initialise(self, servo_init_: dict):
+        """ coro: initialise servos by servo_init dict
             - allows for reading initial states from file
-            - not async: avoid start-up current spike
+            - servos set in turn: avoid start-up current spike
         """
         for pin in servo_init_:
             if servo_init_[pin] == 1:
                 self.servos[pin].set_on()
             else:
                 self.servos[pin].set_off()
-            sleep_ms(500)  # allow movement time
+            await asyncio.sleep_ms(500)  # allow movement time
         for servo in self.servos.values():
             servo.duty_ns(0)
 
+    async def drive_group(self, n_active):
+        """ coro: advance all active servos on a single tick
+            - one scheduler wake-up per tick, not one per servo step
+            - absolute tick deadlines: scheduler latency does not accumulate
+        """
+        active = self._active
+        tick_ms = self.tick_ms
+        sleep_ms = asyncio.sleep_ms  # module attribute
+        deadline = ticks_ms()
+        while n_active:
+            i = 0
+            while i < n_active:
+                if active[i].advance():
+                    # move complete: replace by last active servo
+                    n_active -= 1
+                    active[i] = active[n_active]
+                else:
+                    i += 1
+            deadline = ticks_add(deadline, tick_ms)
+            await sleep_ms(max(0, ticks_diff(deadline, ticks_ms())))
+
     async def match_demand(self, demand: dict):
         """ coro: move each servo to match switch demands """
-        # assign tasks elements: avoid creating new list each call
-        tasks = self.tasks
-        for i, srv_id in enumerate(demand):
-            servo_ = self.servos[srv_id]
-            # coros will not run until awaited
-            tasks[i] = servo_.move_servo(demand[srv_id])
-        # code for 'concurrent' setting
-        result = await asyncio.gather(*tasks)
-        return result  # for testing
+        # clear and refill list: avoid creating new list each call
+        active = self._active
+        active.clear()
+        moved = self._moved
+        moved.clear()
+        servos = self.servos
+        for srv_id in demand:
+            servo_ = servos[srv_id]
+            srv_demand = demand[srv_id]
+            if srv_demand == servo_.state or srv_demand not in servo_.moves:
+                continue  # no move required
+            servo_.start_move(srv_demand)
+            active.append(servo_)
+            moved.append(servo_)
+        if not active:
+            return None
+        # 'concurrent' setting: all servos stepped by one coro
+        await self.drive_group(len(active))
+        return [servo_.state for servo_ in moved]  # for testing
     
 
 async def main():
@@ -200,19 +278,12 @@ async def main():
             json.dump(servo_params_, write_file)
 
     def read_servo_params():
-        """ write servo paramaeters to local JSON file """
+        """ read servo parameters from local JSON file
+            - return tuple of rows: (pin, off_deg, on_deg, ...)
+        """
         with open('servo_params.json', 'r') as read_file:
             data = json.load(read_file)
-        return {int(key): data[key] for key in data}
-
-    def get_servo_demand(sw_states_, switch_servos_):
-        """ return dict of servo setting demands """
-        servo_demand = {}
-        for sw_pin_ in sw_states_:
-            demand_ = sw_states_[sw_pin_]
-            for servo_pin_ in switch_servos_[sw_pin_]:
-                servo_demand[servo_pin_] = demand_
-        return servo_demand
+        return tuple([tuple([int(key)] + data[key]) for key in data])
 
     # switch states in standard interface dict format
     # switch test states include no-change values
@@ -245,22 +316,38 @@ async def main():
                      }
 
     # === end of parameters
+
+    # (switch-pin, servo-pin) pairs: switch-servo binding is static
+    sw_servo_pairs = tuple((sw_pin, servo_pin) for sw_pin in switch_servos
+                           for servo_pin in switch_servos[sw_pin])
+    servo_demand = {servo_pin: 0 for _, servo_pin in sw_servo_pairs}
+
+    def fill_demand(sw_states_):
+        """ set servo_demand values in place from switch states
+            - servo_demand dict is reused: not created for each call
+        """
+        for sw_pin_, servo_pin_ in sw_servo_pairs:
+            servo_demand[servo_pin_] = sw_states_[sw_pin_]
+        return servo_demand
     
     write_servo_params(servo_params)
     
-    servo_params = read_servo_params()
-    print(servo_params)
+    servo_rows = read_servo_params()
+    print(servo_rows)
 
-    servo_group = ServoGroup(servo_params)
+    servo_group = ServoGroup(servo_rows)
     print('initialising servos...')
-    servo_group.initialise(servo_init)
+    await servo_group.initialise(servo_init)
     print('servo_group initialised')
+    gc.collect()  # clear start-up garbage before the test loop
     for sw_states in test_sw_states:
-        print(sw_states)
-        settings = await servo_group.match_demand(
-            get_servo_demand(sw_states, switch_servos))
-        print(settings)
-        gc.collect()
+        if DEBUG:
+            print(sw_states)
+        settings = await servo_group.match_demand(fill_demand(sw_states))
+        if DEBUG:
+            print(settings)
+        if gc.mem_free() < GC_LOW_WATER:
+            gc.collect()
         await asyncio.sleep_ms(1_000)
 
     
@@ -5,9 +5,21 @@
 """
 
 import uasyncio as asyncio
-from machine import Pin, PWM
-from time import sleep_ms
+from machine import Pin, PWM, Timer
+from time import sleep_ms, ticks_ms, ticks_add, ticks_diff
 import gc
+# pwm_slice.py must be uploaded to the Pico
+from pwm_slice import set_slice_freq, clear_slice_freqs
+
+# collect garbage only when free heap falls below this
+GC_LOW_WATER = const(8192)  # bytes
+DEBUG = const(False)  # print per-demand diagnostics
+
+# motion x axis: steps per transition, step increment
+X_STEPS = const(100)
+X_INC = const(1)
+# x steps set per PWM write and sleep: below servo resolution
+STEP_BATCH = const(2)
 
 
 class ServoSG9x(PWM):
@@ -35,6 +47,8 @@ class ServoSG9x(PWM):
     # short delay period
     PAUSE = const(200)  # ms
     SERVO_WAIT = const(500)  # ms
+    # start-up stagger: servo peak current lasts approx 50ms
+    INIT_STAGGER = const(100)  # ms
 
     # motion: x, y axes; straight line between specified points
     # from point (0, 0) to (100, 100); (0, 0) assumed
@@ -48,22 +62,25 @@ class ServoSG9x(PWM):
     }
     # also 'semaphore' for signal "bounce"
 
+    # motion segments (x steps, y start, y change): built once per motion
+    motion_segments = {}
+
     def __init__(self, pin, off_deg, on_deg,
                  transition_period=3.0, motion='linear'):
         super().__init__(Pin(pin))
-        self.freq(self.FREQ)
+        set_slice_freq(self, pin, self.FREQ)
         self.id = pin  # for diagnostics
+        self._set_pw = self.duty_ns  # instance look-up, not via PWM type
         self.off_ns = self.degrees_to_ns(off_deg)
         self.on_ns = self.degrees_to_ns(on_deg)
         self.transition_ms = int(transition_period * 1000)
         self.pw_ns = None  # for self.activate_pulse()
+        self._end_ns = (self.off_ns, self.on_ns)  # indexed by OFF, ON
         self.state = None
         # set servo (x, y) transition parameters
         self.pw_range = self.on_ns - self.off_ns
-        self.x_inc = 1
-        self.x_steps = 100
-        self.step_ms = self.transition_ms // self.x_steps
-        self.pw_on_inc = (self.on_ns - self.off_ns) // self.x_steps  # per y step
+        self.step_ms = self.transition_ms // X_STEPS
+        self.pw_on_inc = (self.on_ns - self.off_ns) // X_STEPS  # per y step
         self.pw_off_inc = -self.pw_on_inc
         # set motion parameters
         if motion == 'semaphore':
@@ -72,8 +89,16 @@ class ServoSG9x(PWM):
         else:
             motion_on = motion
             motion_off = motion
-        self.on_coords = self.motion_coords[motion_on]
-        self.off_coords = self.motion_coords[motion_off]
+        self.on_segments = self.get_segments(motion_on)
+        self.off_segments = self.get_segments(motion_off)
+        # segment plans: built once, not for each move
+        self.off_plan = self.build_plan(
+            self.on_ns, self.pw_off_inc, self.off_segments)
+        self.on_plan = self.build_plan(
+            self.off_ns, self.pw_on_inc, self.on_segments)
+        # move parameters by demand: (plan, final_ns)
+        self.moves = {self.OFF: (self.off_plan, self.off_ns),
+                      self.ON: (self.on_plan, self.on_ns)}
         # relay object must be assigned if required
         self.relay = None
 
@@ -86,73 +111,96 @@ class ServoSG9x(PWM):
 
     def move_servo(self, pw_):
         """ servo machine.PWM setting method """
-        # guard against out-of-range demands
-        if self.PW_MIN <= pw_ <= self.PW_MAX:
-            self.duty_ns(pw_)
-
-    def set_off(self):
-        """ move servo direct to off position """
-        self.move_servo(self.off_ns)
-        self.pw_ns = self.off_ns
-        self.state = self.OFF
-
-    def set_on(self):
-        """ move servo direct to on position """
-        self.move_servo(self.on_ns)
-        self.pw_ns = self.on_ns
-        self.state = self.ON
-
-    async def stepper(self, start_pw, pw_inc_, coords_):
-        """ move servo in linear segments """
+        # clamp out-of-range demands to the nearest limit
+        self._set_pw(self.PW_MAX if pw_ > self.PW_MAX
+                     else self.PW_MIN if pw_ < self.PW_MIN else pw_)
+
+    def set_state(self, demand_):
+        """ move servo direct to off (0) or on (1) position """
+        pw_ = self._end_ns[demand_]
+        self.move_servo(pw_)
+        self.pw_ns = pw_
+        self.state = demand_
+
+    def get_segments(self, motion):
+        """ return tuple of (dx, y_0, dy) segments for motion coords
+            - shared by all servos with the same motion
+        """
+        segments = ServoSG9x.motion_segments.get(motion)
+        if segments is None:
+            seg_list = []
+            x_0 = 0
+            y_0 = 0
+            for x1, y1 in self.motion_coords[motion]:
+                seg_list.append((x1 - x_0, y_0, y1 - y_0))
+                x_0 = x1
+                y_0 = y1
+            segments = tuple(seg_list)
+            ServoSG9x.motion_segments[motion] = segments
+        return segments
+
+    def build_plan(self, start_pw, pw_inc_, segments):
+        """ return tuple of linear segments for a move
+            - segment: (pw_, n_writes, write_pw_inc, k_steps, in_range)
+            - pw_ is the segment start pulse-width
+            - each write covers k_steps x steps: STEP_BATCH or the tail
+        """
+        plan = []
+        for dx, y_0, dy in segments:
+            n_steps = dx // X_INC
+            segment_pw_inc = (pw_inc_ * dy) // n_steps
+            pw_ = pw_inc_ * y_0 + start_pw
+            # pw_ is monotonic within a segment: check range once
+            pw_end = pw_ + segment_pw_inc * n_steps
+            in_range = (self.PW_MIN <= pw_ <= self.PW_MAX
+                        and self.PW_MIN <= pw_end <= self.PW_MAX)
+            n_writes = n_steps // STEP_BATCH
+            if n_writes:
+                plan.append((pw_, n_writes, segment_pw_inc * STEP_BATCH,
+                             STEP_BATCH, in_range))
+            tail = n_steps - n_writes * STEP_BATCH
+            if tail:
+                pw_ += segment_pw_inc * n_writes * STEP_BATCH
+                plan.append((pw_, 1, segment_pw_inc * tail, tail, in_range))
+        return tuple(plan)
+
+    async def stepper(self, plan):
+        """ move servo through planned linear segments
+            - absolute step deadlines: scheduler latency does not accumulate
+        """
         # local vars avoid repeated dictionary look-ups
         step_ms = self.step_ms
-        x_inc = self.x_inc
         move_servo = self.move_servo
-        x_0 = 0
-        y_0 = 0
-        for x1, y1 in coords_:
-            pw_0 = pw_inc_ * y_0
-            pw_1 = pw_inc_ * y1
-            segment_pw_inc = (pw_1 - pw_0) // (x1 - x_0)
-            pw_ = pw_0 + start_pw
-            x = x_0
-            while x < x1:
-                x += x_inc
-                pw_ += segment_pw_inc
-                move_servo(pw_)
-                await asyncio.sleep_ms(step_ms)
-            x_0 = x1
-            y_0 = y1
+        duty_ns = self._set_pw
+        async_sleep_ms = asyncio.sleep_ms  # not time.sleep_ms
+        deadline = ticks_ms()
+        for pw_, n_writes, write_pw_inc, k_steps, in_range in plan:
+            set_pw = duty_ns if in_range else move_servo
+            write_ms = step_ms * k_steps
+            for _ in range(n_writes):
+                pw_ += write_pw_inc
+                set_pw(pw_)
+                deadline = ticks_add(deadline, write_ms)
+                await async_sleep_ms(max(0, ticks_diff(deadline, ticks_ms())))
         return pw_
 
     async def set_on_off(self, demand_):
         """ move servo between off and on positions """
         # move servo between off and on pulse-widths
         # set parameters
-        if demand_ == self.state:
-            return
-        elif demand_ == self.OFF:
-            pw_inc = self.pw_off_inc
-            final_ns = self.off_ns
-            coords = self.off_coords
-        elif demand_ == self.ON:
-            pw_inc = self.pw_on_inc
-            final_ns = self.on_ns
-            coords = self.on_coords
-        else:
+        if demand_ == self.state or demand_ not in self.moves:
             return
+        plan, final_ns = self.moves[demand_]
 
         # relay object must be assigned to servo object if required
         # delay for 50% transition time
         if self.relay:
-            # noinspection PyAsyncCall
-            asyncio.create_task(
-                self.relay.set_state(demand_, self.transition_ms//2))
-        # restore pulse (not essential) and move servo
-        self.duty_ns(self.pw_ns)
-        sw_ns = await self.stepper(self.pw_ns, pw_inc, coords)
-        # check for software setting error
-        print(f'{final_ns} {sw_ns} {(sw_ns - final_ns) / final_ns * 100:.2f}%')
+            self.relay.set_state(demand_, self.transition_ms//2)
+        # move servo: first step restores the pulse
+        sw_ns = await self.stepper(plan)
+        if DEBUG:
+            # check for software setting error
+            print(f'{final_ns} {sw_ns} {(sw_ns - final_ns) / final_ns * 100:.2f}%')
         # switch off pulse
         self.duty_ns(0)
         # save final state
@@ -168,6 +216,7 @@ class ServoGroup:
     """
     # kwargs for 'optional extras' parameters: relays in this case
     def __init__(self, servo_parameters, **kwargs):
+        clear_slice_freqs()  # group (re-)built: set each slice frequency
         servos = {pin: ServoSG9x(pin, *servo_parameters[pin])
                   for pin in servo_parameters}
         # if relays are specified, add to servo objects
@@ -178,8 +227,9 @@ class ServoGroup:
                 if pin in s_r:
                     servos[pin].relay = Relay(s_r[pin])
         self.servos = servos
-        # task list: avoid creating new list for each method call
-        self.tasks = [None] * len(self.servos)
+        # join servo tasks without asyncio.gather()
+        self._pending = 0
+        self._done = asyncio.Event()
 
     def initialise(self, servo_init_: dict):
         """ initialise servos by servo_init dict
@@ -187,23 +237,41 @@ class ServoGroup:
             - not async: avoid start-up current spike
         """
         for pin in servo_init_:
-            if servo_init_[pin] == 1:
-                self.servos[pin].set_on()
-            else:
-                self.servos[pin].set_off()
-            sleep_ms(500)  # allow movement time
+            servo = self.servos[pin]
+            servo.set_state(servo.ON if servo_init_[pin] == 1 else servo.OFF)
+            sleep_ms(servo.INIT_STAGGER)  # stagger start-up current
+        sleep_ms(ServoSG9x.SERVO_WAIT)  # allow movement time
         for servo in self.servos.values():
             servo.duty_ns(0)
 
+    async def _run(self, coro):
+        """ coro: run servo move; set _done when all moves complete """
+        try:
+            await coro
+        finally:
+            self._pending -= 1
+            if self._pending == 0:
+                self._done.set()
+
     async def match_demand(self, demand: dict):
-        """ coro: move each servo to match switch demands """
-        tasks = self.tasks
-        for i, srv_id in enumerate(demand):
-            servo_ = self.servos[srv_id]
-            tasks[i] = servo_.move_servo(demand[srv_id])
-        # run tasks
-        result = await asyncio.gather(*tasks)
-        return result  # for testing
+        """ coro: move each servo to match switch demands
+            - return number of servos moved (for testing)
+        """
+        servos = self.servos
+        done = self._done
+        done.clear()
+        self._pending = 0
+        for srv_id in demand:
+            servo_ = servos[srv_id]
+            if demand[srv_id] == servo_.state:
+                continue  # no task required
+            # count before scheduling: tasks do not run until awaited
+            self._pending += 1
+            asyncio.create_task(self._run(servo_.set_on_off(demand[srv_id])))
+        n_moved = self._pending
+        if n_moved:
+            await done.wait()
+        return n_moved
 
 
 class Relay(Pin):
@@ -212,22 +280,48 @@ class Relay(Pin):
     def __init__(self, pin):
         super().__init__(pin, Pin.OUT)
         self.pin = pin  # for diagnostics
-
-    async def set_state(self, demand, delay):
-        """ set relay pin-out after delay ms """
+        # one-shot Timer for delayed setting: reused for each call
+        self._timer = Timer()
+        self._demand = 0
+        self._on_timer = self._set  # bind once for Timer callback
+
+    def _set(self, _):
+        """ Timer callback: set relay pin-out """
+        self.value(self._demand)
+
+    def set_state(self, demand, delay):
+        """ set relay pin-out after delay ms
+            - not a coro: no Task for a single pin write
+        """
         # delay: normally half servo transit-time
-        await asyncio.sleep_ms(delay)
-        self.value(demand)
+        self._demand = demand
+        self._timer.init(mode=Timer.ONE_SHOT, period=delay,
+                         callback=self._on_timer)
 
 
-def get_servo_demand(sw_states_, switch_servos_):
-    """ return dict of servo setting demands """
-    servo_demand = {}
-    for sw_pin_ in sw_states_:
-        demand_ = sw_states_[sw_pin_]
-        for servo_pin_ in switch_servos_[sw_pin_]:
-            servo_demand[servo_pin_] = demand_
-    return servo_demand
+def make_get_servo_demand(switch_servos_):
+    """ return get_servo_demand() specialised for switch_servos_
+        - switch-servo fan-out is flattened once, in a closure
+    """
+    fan_out = tuple([(sw_pin_, tuple(switch_servos_[sw_pin_]))
+                     for sw_pin_ in switch_servos_])
+
+    def get_servo_demand(sw_states_, prev_states_, servo_demand):
+        """ return dict of servo demands for changed switches only
+            - prev_states_ dict is updated to sw_states_
+            - servo_demand dict is reused: not created for each call
+        """
+        servo_demand.clear()
+        for sw_pin_, servo_pins_ in fan_out:
+            demand_ = sw_states_[sw_pin_]
+            if prev_states_.get(sw_pin_) == demand_:
+                continue  # no change: servos already set
+            prev_states_[sw_pin_] = demand_
+            for servo_pin_ in servo_pins_:
+                servo_demand[servo_pin_] = demand_
+        return servo_demand
+
+    return get_servo_demand
 
 
 async def main():
@@ -269,12 +363,19 @@ async def main():
     print('initialising servos...')
     servo_group.initialise(servo_init)
     print('servo_group initialised')
+    get_servo_demand = make_get_servo_demand(switch_servos)
+    prev_states = {}  # empty: first states set every servo
+    demand = {}  # filled for each set of switch states
+    gc.collect()  # clear start-up garbage before the test loop
     for sw_states in test_sw_states:
-        print(sw_states)
+        if DEBUG:
+            print(sw_states)
         settings = await servo_group.match_demand(
-            get_servo_demand(sw_states, switch_servos))
-        print(settings)
-        gc.collect()
+            get_servo_demand(sw_states, prev_states, demand))
+        if DEBUG:
+            print(settings)
+        if gc.mem_free() < GC_LOW_WATER:
+            gc.collect()
         await asyncio.sleep_ms(1_000)
 
 
@@ -0,0 +1,349 @@
+""" Servo control by PWM: stepped on/off moves
+    - shared by the servo demonstration scripts
+    - stable library code: can be precompiled with mpy-cross
+      or frozen into firmware to save RAM and import time
+"""
+
+import asyncio  # cooperative multitasking
+from machine import PWM, Timer, mem32
+import micropython
+from micropython import const
+from array import array
+from time import ticks_ms, ticks_diff, sleep_ms
+from pwm_slice import set_slice_freq, clear_slice_freqs
+
+DEBUG = const(False)  # print per-demand diagnostics
+
+N_GPIO = const(30)  # RP2040 GPIO 0-29
+
+# RP2040 PWM registers: byte offsets
+PWM_BASE = const(0x40050000)
+PWM_SLICE = const(0x14)  # register block per slice
+PWM_CC = const(0x0c)  # channel A: bits 0-15; B: bits 16-31
+PWM_TOP = const(0x10)
+
+# SG90 servos specify f = 50Hz
+FREQ = const(50)  # Hz
+PERIOD_NS = const(1_000_000_000 // FREQ)
+
+# specified servo motion is from 0 to 180 degrees
+# corresponding pulse widths: 500_000 to 2_500_000 ns
+PW_CTR = const(1_500_000)
+PW_MIN = const(500_000)  # ns
+PW_MAX = const(2_500_000)  # ns
+DEG_MIN = const(0)  # include for offset degrees
+DEG_MAX = const(180)
+NS_PER_DEGREE = const((PW_MAX - PW_MIN) // (DEG_MAX - DEG_MIN))
+
+@micropython.viper
+def write_cc(cc_addr: int, shift: int, count: int):
+    """ viper: set PWM counter-compare for one channel
+        - 16-bit writes are replicated to both halves:
+          read-modify-write the 32-bit register
+    """
+    cc = ptr32(cc_addr)
+    keep = 0xffff << (16 - shift)  # other channel
+    cc[0] = (cc[0] & keep) | (count << shift)
+
+
+@micropython.viper
+def advance(cc_steps, move, cc_addr: int, shift: int) -> int:
+    """ viper: count down one tick; set next step when due
+        - cc_steps: array('H') of counter-compare values
+        - move: array('i') of [index, wait, n_ticks]
+        - return 1 when all steps are complete
+    """
+    mv = ptr32(move)
+    wait = mv[1] - 1
+    mv[1] = wait
+    if wait:
+        return 0
+    index = mv[0]
+    if index == int(len(cc_steps)):
+        return 1
+    steps = ptr16(cc_steps)
+    cc = ptr32(cc_addr)
+    keep = 0xffff << (16 - shift)  # other channel
+    cc[0] = (cc[0] & keep) | (int(steps[index]) << shift)
+    mv[0] = index + 1
+    mv[1] = mv[2]
+    return 0
+
+
+class ServoSG9x(PWM):
+    """
+        control a servo by PWM
+        - class control parameter is pulse-width in nanoseconds
+        - user units: degrees
+        - pulse-width constants at module level: folded by compiler
+    """
+    OFF = const(0)
+    ON = const(1)
+
+    # short delay period
+    PAUSE = const(200)  # ms
+    DEMAND_MS = const(1000)  # minimum period between demands
+    INIT_STAGGER = const(100)  # ms between servo start-ups
+
+    def __init__(self, pin, off_deg, on_deg, transition_time=3.0):
+        super().__init__(pin)  # pin number: no Pin object required
+        set_slice_freq(self, pin, FREQ)
+        slice_n = (pin >> 1) & 7
+        self.id = pin
+        # PWM slice registers for direct counter-compare writes
+        slice_ = PWM_BASE + slice_n * PWM_SLICE
+        self._cc_addr = slice_ + PWM_CC
+        self._cc_shift = (pin & 1) << 4
+        top_1 = mem32[slice_ + PWM_TOP] + 1
+        self.off_ns = self.degrees_to_ns(off_deg)
+        self.on_ns = self.degrees_to_ns(on_deg)
+        self.transition_ms = int(transition_time * 1000)
+        self.state = None
+        self.pw_ns = None
+        self.x_steps = 100
+        self._step_ms = self.transition_ms // self.x_steps
+        # pulse-width for each step: off-to-on and on-to-off
+        # - final step is precise setting
+        # - stored as PWM counter-compare values
+        pw_inc = (self.on_ns - self.off_ns) // self.x_steps
+        pw_on = [self.off_ns + pw_inc * i for i in range(1, self.x_steps)]
+        pw_on.append(self.on_ns)
+        pw_off = [self.on_ns - pw_inc * i for i in range(1, self.x_steps)]
+        pw_off.append(self.off_ns)
+        self._cc_on = array(
+            'H', [pw * top_1 // PERIOD_NS for pw in pw_on])
+        self._cc_off = array(
+            'H', [pw * top_1 // PERIOD_NS for pw in pw_off])
+        # step timing: _n_ticks set by ServoGroup
+        self._n_ticks = 1  # ticks per step
+        # move in progress: set by start_move()
+        self._demand = None
+        self._steps = self._cc_on
+        self._pw_end = self.on_ns
+        self._move = array('i', [0, 0, 1])  # index, wait, n_ticks
+        self._released = True  # no PWM pulse
+
+    @staticmethod
+    def degrees_to_ns(degrees):
+        """ convert float degrees to int pulse-width ns """
+        return int(PW_MIN + (degrees - DEG_MIN) * NS_PER_DEGREE)
+
+    def set_off(self):
+        """ move direct to off position; set object attributes
+            - PWM holds the position
+        """
+        self.duty_ns(self.off_ns)
+        self.pw_ns = self.off_ns
+        self.state = self.OFF
+        self._released = False
+
+    def set_on(self):
+        """ move direct to on position; set object attributes
+            - PWM holds the position
+        """
+        self.duty_ns(self.on_ns)
+        self.pw_ns = self.on_ns
+        self.state = self.ON
+        self._released = False
+
+    def release(self):
+        """ stop PWM pulse: servo no longer holds position
+            - optional: reduces idle current
+        """
+        self.duty_ns(0)
+        self._released = True
+
+    def start_move(self, demand):
+        """ set first step towards demand state
+            - remaining steps are set by step()
+            - PWM restored only if servo was released
+        """
+        self._demand = demand
+        if demand == self.ON:
+            self._steps = self._cc_on
+            self._pw_end = self.on_ns
+        else:
+            self._steps = self._cc_off
+            self._pw_end = self.off_ns
+        if self._released:
+            self.duty_ns(self.pw_ns)
+            self._released = False
+        write_cc(self._cc_addr, self._cc_shift, self._steps[0])
+        move = self._move
+        move[0] = 1  # next index
+        move[1] = self._n_ticks
+        move[2] = self._n_ticks
+
+    @micropython.native
+    def step(self):
+        """ called on each tick: set next step when due
+            - native code: called for each moving servo on every tick
+            - viper advance() holds step state in array _move
+            - return True when move is complete
+        """
+        if advance(self._steps, self._move, self._cc_addr, self._cc_shift):
+            self.pw_ns = self._pw_end
+            self.state = self._demand
+            return True
+        return False
+
+
+class ServoGroup:
+    """ create a list of servo objects for servo control
+        - list indexed by servo id (pin): servo-object
+        - get switch-demands from self.buffer: match_demand()
+          or set each demand directly: set_demand()
+        - all moving servos are stepped by a single sweep
+    """
+
+    def __init__(self, servo_parameters, buffer=None):
+        clear_slice_freqs()  # group (re-)built: set each slice frequency
+        self.servos = tuple([ServoSG9x(pin, *servo_parameters[pin])
+                             for pin in servo_parameters])
+        # look-up by pin as list index: no dict hashing
+        self.id_servo = [None] * N_GPIO
+        for servo in self.servos:
+            self.id_servo[servo.id] = servo
+        self.buffer = buffer
+        # shared step tick for concurrent servo moves
+        # - greatest common divisor of step periods: exact step timing
+        tick_ms = 0
+        for servo in self.servos:
+            a, b = tick_ms, servo._step_ms
+            while b:
+                a, b = b, a % b
+            tick_ms = a
+        tick_ms = max(1, tick_ms)
+        self._ticks = TickSource(tick_ms)
+        for servo in self.servos:
+            servo._n_ticks = max(1, servo._step_ms // tick_ms)
+        # bound step() methods: avoid attribute look-up on each tick
+        self.id_step = [None] * N_GPIO
+        for servo in self.servos:
+            self.id_step[servo.id] = servo.step
+        # steps in current sweep: avoid creating new lists for each demand
+        self._active = [None] * len(self.servos)
+        self._moved = [None] * len(self.servos)
+
+    def initialise(self, servo_init_):
+        """ initialise servos by servo_init list
+            - allows for reading initial states from file
+            - set in turn, INIT_STAGGER apart: stagger start-up current
+        """
+        for id_ in servo_init_:
+            servo = self.id_servo[id_]
+            if servo_init_[id_] == servo.ON:
+                servo.set_on()
+            else:
+                servo.set_off()
+            sleep_ms(servo.INIT_STAGGER)
+
+    async def sweep(self, n_active):
+        """ coro: step each active servo on each tick until all complete
+            - one scheduler wake-up per tick for all servos
+        """
+        active = self._active
+        ticks = self._ticks
+        wait_tick = ticks.wait
+        ticks.start()
+        try:
+            while n_active:
+                await wait_tick()
+                i = 0
+                while i < n_active:
+                    if active[i]():
+                        # move complete: replace by last active servo
+                        n_active -= 1
+                        active[i] = active[n_active]
+                    else:
+                        i += 1
+        finally:
+            ticks.stop()
+
+    async def set_demand(self, demand):
+        """ coro: move servos to match a single demand
+            - demand: dict- servo_id: demand
+            - preallocated _active and _moved lists are reused
+            - return (id, state) for each servo moved
+        """
+        id_servo = self.id_servo
+        id_step = self.id_step
+        active = self._active
+        moved = self._moved
+        n_active = 0
+        for id_ in demand:
+            servo = id_servo[id_]
+            srv_demand = demand[id_]
+            if srv_demand == servo.state:
+                continue  # already at demand setting
+            elif srv_demand == servo.ON or srv_demand == servo.OFF:
+                servo.start_move(srv_demand)
+                active[n_active] = id_step[id_]
+                moved[n_active] = servo
+                n_active += 1
+        if not n_active:
+            return ()
+        await self.sweep(n_active)
+        return tuple([(moved[i].id, moved[i].state) for i in range(n_active)])
+
+    async def match_demand(self):
+        """ coro: match servo positions to on/off switch demands
+            - demands are taken from self.buffer
+        """
+        # bind once: not looked up for each demand
+        get_demand = self.buffer.get
+        set_demand = self.set_demand
+        last_demand = None
+        demand_ms = ServoSG9x.DEMAND_MS
+        last_ms = ticks_ms()
+        while True:
+            # data consumer
+            demand = await get_demand()
+            if demand == last_demand:
+                continue  # no change: no servo can need to move
+            last_demand = demand
+            if DEBUG:
+                print()
+                print(f'match demand: {demand}')
+            await set_demand(demand)
+            if DEBUG:
+                print([(s.id, s.state) for s in self.servos])
+            # pause for any remainder of demand period
+            wait = demand_ms - ticks_diff(ticks_ms(), last_ms)
+            if wait > 0:
+                await asyncio.sleep_ms(wait)
+            last_ms = ticks_ms()
+
+    def __str__(self):
+        """ print out servo parameters """
+        s = ''
+        for servo in self.servos:
+            s += f'id: {servo.id} off_ns: {servo.off_ns} on_ns: {servo.on_ns} transition_ms {servo.transition_ms}'
+        return s
+
+
+class TickSource:
+    """ step tick for servo sweeps
+        - hardware Timer paces the ticks: no scheduler sleep per step
+    """
+
+    def __init__(self, period_ms):
+        self.period_ms = period_ms
+        self._flag = asyncio.ThreadSafeFlag()
+        self.wait = self._flag.wait  # coro: await next tick
+        self._timer = Timer()
+        self._callback = self._on_timer  # bind once
+
+    def _on_timer(self, _):
+        """ Timer callback: ThreadSafeFlag can be set from an IRQ """
+        self._flag.set()
+
+    def start(self):
+        """ start periodic ticks """
+        self._flag.clear()  # discard any stale tick
+        self._timer.init(mode=Timer.PERIODIC, period=self.period_ms,
+                         callback=self._callback)
+
+    def stop(self):
+        """ stop ticks """
+        self._timer.deinit()